@@ -1,119 +1,210 @@
-import os
-from dotenv import load_dotenv
-from sqlalchemy import create_engine, text
+import threading
+from cachetools import TTLCache
+from sqlalchemy import text, bindparam, Float, String
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine
 from sqlalchemy.exc import OperationalError
-from typing import List, Dict, Any
+from database import engine, DATABASE_URL
+from typing import List, Any, Mapping, Optional
 
-# モジュール読み込み時に一度だけ環境変数をロード
-load_dotenv()
+# database.pyのエンジンとコネクションプールを共有する。
+# 読み取り専用のSELECTしか発行しないため、AUTOCOMMITでBEGIN/COMMITの往復を省く。
+_ENGINE = engine.execution_options(isolation_level="AUTOCOMMIT")
 
-def get_nearest_braking_events(target_lat: float, target_lon: float) -> List[Dict[str, Any]]:
+# 非同期版の検索で使うasyncpgドライバのエンジン (こちらも初回呼び出し時に1つだけ作成する)
+# プールされたasyncpgのコネクションは最初に使ったイベントループに結び付くため、
+# このエンジンはFastAPIアプリのイベントループ上からのみ使うこと (asyncio.runで作った別ループからは使わない)。
+_ASYNC_ENGINE: Optional[AsyncEngine] = None
+
+def _get_async_engine() -> AsyncEngine:
+    """
+    DATABASE_URLからasyncpgドライバを使う非同期エンジンを初回呼び出し時に作成して返す。
+    """
+    global _ASYNC_ENGINE
+    if _ASYNC_ENGINE is None:
+        url = make_url(DATABASE_URL).set(drivername="postgresql+asyncpg")
+        # asyncpgはlibpq用のsslmode/channel_bindingを解釈できないため、sslパラメータに置き換える
+        query = dict(url.query)
+        sslmode = query.pop("sslmode", None)
+        query.pop("channel_binding", None)
+        if sslmode:
+            query["ssl"] = sslmode
+        _ASYNC_ENGINE = create_async_engine(
+            url.set(query=query),
+            pool_size=10,
+            max_overflow=20,
+            pool_pre_ping=True,
+            pool_recycle=1800,
+            # 読み取り専用のSELECTしか発行しないため、BEGIN/COMMITの往復を省く
+            isolation_level="AUTOCOMMIT"
+        )
+    return _ASYNC_ENGINE
+
+# geog列のGiSTインデックスを使い、KNN演算子(<->)で近い順に走査する。
+# 半径を段階的に広げて何度も検索する代わりに、1回の問い合わせで上位20件を取得する。
+# 検索中心点は結合用の1行サブクエリで一度だけ解析し、距離計算と並び替えの両方で参照する。
+# クエリはモジュール読み込み時に一度だけ構築し、呼び出し間で使い回す。
+_NEAREST_QUERY = text("""
+    SELECT
+        e.id,
+        e.latitude,
+        e.longitude,
+        e.event_timestamp,
+        ST_Distance(e.geog, q.pt) / 1000 AS distance_km
+    FROM
+        "BrakingEvents" AS e,
+        (SELECT ST_GeogFromText(:target_point) AS pt) AS q
+    ORDER BY
+        e.geog <-> q.pt
+    LIMIT 20;
+""").bindparams(
+    bindparam("target_point", type_=String)
+)
+
+# 半径の上限が指定された場合の検索クエリ。
+# ST_DWithinとKNNを組み合わせ、半径外に出た時点でインデックスの走査を打ち切る。
+_NEAREST_WITHIN_QUERY = text("""
+    SELECT
+        e.id,
+        e.latitude,
+        e.longitude,
+        e.event_timestamp,
+        ST_Distance(e.geog, q.pt) / 1000 AS distance_km
+    FROM
+        "BrakingEvents" AS e,
+        (SELECT ST_GeogFromText(:target_point) AS pt) AS q
+    WHERE
+        ST_DWithin(e.geog, q.pt, :radius_m)
+    ORDER BY
+        e.geog <-> q.pt
+    LIMIT 20;
+""").bindparams(
+    bindparam("target_point", type_=String),
+    bindparam("radius_m", type_=Float)
+)
+
+def _build_query(target_lat: float, target_lon: float, radius_cap_km: Optional[float]) -> tuple:
+    """ 半径の上限の有無に応じて、実行するクエリとバインドパラメータを返す """
+    # PostGISのEWKT形式で検索中心点を表す (経度, 緯度の順)
+    target_point = f"SRID=4326;POINT({target_lon} {target_lat})"
+    if radius_cap_km is None:
+        return _NEAREST_QUERY, {"target_point": target_point}
+    return _NEAREST_WITHIN_QUERY, {"target_point": target_point, "radius_m": radius_cap_km * 1000}
+
+def _print_search_result(results_list: List[Mapping[str, Any]], radius_cap_km: Optional[float]) -> None:
+    """ 検索結果の件数と最も近いデータまでの距離を表示する """
+    if results_list:
+        # 取得したデータの中で最も近いものとの距離を表示
+        nearest_distance = results_list[0]['distance_km']
+        print(f" -> 最も近いデータ({nearest_distance:.2f} km先)を含む{len(results_list)}件のデータを見つけました。")
+    elif radius_cap_km is not None:
+        print(f" -> 半径 {radius_cap_km} km以内ではデータが見つかりませんでした。")
+    else:
+        # このメッセージが表示されるのは、DBのテーブルが完全に空の場合のみ
+        print(" -> データベースにデータが1件も存在しませんでした。")
+
+# 近い座標からの再検索に備え、KNN検索の結果を一定時間キャッシュする。
+# キーは小数第3位 (約100m四方) に丸めた座標と半径の上限。
+_RESULT_CACHE: TTLCache = TTLCache(maxsize=4096, ttl=300)
+_RESULT_CACHE_LOCK = threading.Lock()
+
+def _result_cache_key(target_lat: float, target_lon: float, radius_cap_km: Optional[float]) -> tuple:
+    """ 座標を約100m単位に丸めたキャッシュキーを返す """
+    return (round(target_lat, 3), round(target_lon, 3), radius_cap_km)
+
+def get_nearest_braking_events(
+    target_lat: float,
+    target_lon: float,
+    radius_cap_km: Optional[float] = None
+) -> List[Mapping[str, Any]]:
     """
-    指定された座標周辺の急ブレーキイベントをデータベースから最大20件取得する。
-    データが見つからない場合、検索範囲を動的に拡大し、最終的には全範囲を検索して必ず見つけ出す。
+    指定された座標に近い順に、急ブレーキイベントをデータベースから最大20件取得する。
+    KNN検索を1回だけ実行するため、周辺にデータがなくても最も近いデータが必ず見つかる。
 
     Args:
         target_lat (float): 中心の緯度
         target_lon (float): 中心の経度
+        radius_cap_km (Optional[float]): 指定した場合、この距離(km)以内のデータだけを検索する。
 
     Returns:
-        List[Dict[str, Any]]: 取得したイベントデータのリスト。各辞書には距離(km)も含まれる。
+        List[Mapping[str, Any]]: 取得したイベントデータのリスト。各行には距離(km)も含まれる。
+            行は読み取り専用のRowMappingで、キャッシュと共有されるため変更しないこと。
+    """
+    cache_key = _result_cache_key(target_lat, target_lon, radius_cap_km)
+    with _RESULT_CACHE_LOCK:
+        results_list = _RESULT_CACHE.get(cache_key)
+
+    if results_list is None:
+        query, params = _build_query(target_lat, target_lon, radius_cap_km)
+
+        try:
+            with _ENGINE.connect() as connection:
+                print(f"データベースに接続し、({target_lat}, {target_lon}) 周辺の急ブレーキデータを検索しています...")
+
+                result_proxy = connection.execute(query, params)
+                results_list = result_proxy.mappings().all()
+
+        except OperationalError as e:
+            print(f"データベースへの接続に失敗しました: {e}")
+            return []
+        except Exception as e:
+            print(f"予期せぬエラーが発生しました: {e}")
+            return []
+
+        with _RESULT_CACHE_LOCK:
+            _RESULT_CACHE[cache_key] = results_list
+    else:
+        print(f"({target_lat}, {target_lon}) 周辺の急ブレーキデータをキャッシュから取得しました。")
+
+    _print_search_result(results_list, radius_cap_km)
+    return results_list
+
+async def get_nearest_braking_events_async(
+    target_lat: float,
+    target_lon: float,
+    radius_cap_km: Optional[float] = None
+) -> List[Mapping[str, Any]]:
     """
-    database_url = os.getenv("DATABASE_URL")
-
-    if not database_url:
-        print("エラー: .envファイルにDATABASE_URLが設定されていません。")
-        return []
-
-    # 最初に試す、段階的な検索半径のリスト (単位: km)
-    search_radii_km = [1.0, 5.0, 10.0, 25.0, 50.0]
-    
-    results_list = []
-    # 地球の半径 (km)
-    EARTH_RADIUS_KM = 6371
-
-    # Haversine公式を含むサブクエリを使い、計算結果のdistance_kmで範囲を絞り込む
-    query = text(f"""
-        SELECT
-            *
-        FROM (
-            SELECT
-                id,
-                latitude,
-                longitude,
-                event_timestamp,
-                (
-                    {EARTH_RADIUS_KM} * 2 * ASIN(SQRT(
-                        POWER(SIN(RADIANS(latitude - :target_lat) / 2), 2) +
-                        COS(RADIANS(:target_lat)) * COS(RADIANS(latitude)) *
-                        POWER(SIN(RADIANS(longitude - :target_lon) / 2), 2)
-                    ))
-                ) AS distance_km
-            FROM
-                "BrakingEvents"
-        ) AS events_with_distance
-        WHERE
-            distance_km <= :radius_km
-        ORDER BY
-            distance_km
-        LIMIT 20;
-    """)
-
-    try:
-        engine = create_engine(database_url)
-        with engine.connect() as connection:
-            print(f"データベースに接続し、({target_lat}, {target_lon}) 周辺の急ブレーキデータを検索しています...")
-            
-            # --- フェーズ1: 段階的な近傍検索 ---
-            for radius in search_radii_km:
-                print(f" -> 半径 {radius} km以内で検索中...")
-                
-                result_proxy = connection.execute(query, {
-                    "target_lat": target_lat,
-                    "target_lon": target_lon,
-                    "radius_km": radius
-                })
-                results_list = [dict(row._mapping) for row in result_proxy]
-                
-                # データが見つかったら、その時点で即座に結果を返して処理を終了
-                if results_list:
-                    print(f" -> {len(results_list)}件のデータを半径 {radius} km以内で見つけました。")
-                    return results_list
-            
-            # --- ▼▼▼ ここからが修正箇所 ▼▼▼ ---
-
-            # --- フェーズ2: 全範囲検索 (最終手段) ---
-            # 上記のループで見つからなかった場合のみ、以下の処理が実行される
-            print(f" -> 半径 {search_radii_km[-1]} km以内ではデータが見つかりませんでした。")
-            print(" -> 最終手段として、範囲を無制限に広げてデータベース全体を検索します...")
-
-            # 地球の半周より大きい、事実上「無限」とみなせる半径を設定
-            INFINITE_RADIUS_KM = 21000 
-
-            result_proxy = connection.execute(query, {
-                "target_lat": target_lat,
-                "target_lon": target_lon,
-                "radius_km": INFINITE_RADIUS_KM
-            })
-            results_list = [dict(row._mapping) for row in result_proxy]
-
-            if results_list:
-                # 取得したデータの中で最も近いものとの距離を表示
-                nearest_distance = results_list[0]['distance_km']
-                print(f" -> 全範囲を検索し、最も近いデータ({nearest_distance:.2f} km先)を{len(results_list)}件見つけました。")
-            else:
-                # このメッセージが表示されるのは、DBのテーブルが完全に空の場合のみ
-                print(" -> データベースにデータが1件も存在しませんでした。")
-            
-            # --- ▲▲▲ ここまでが修正箇所 ▲▲▲ ---
-
-    except OperationalError as e:
-        print(f"データベースへの接続に失敗しました: {e}")
-        return []
-    except Exception as e:
-        print(f"予期せぬエラーが発生しました: {e}")
-        return []
+    get_nearest_braking_events の非同期版。
+    スレッドを使わずにFastAPIのイベントループ上で待機できるよう、asyncpgで問い合わせる。
+    asyncpgのコネクションプールはアプリのイベントループに結び付くため、
+    エンドポイントなどアプリのイベントループ上からのみ呼び出すこと。
 
+    Args:
+        target_lat (float): 中心の緯度
+        target_lon (float): 中心の経度
+        radius_cap_km (Optional[float]): 指定した場合、この距離(km)以内のデータだけを検索する。
+
+    Returns:
+        List[Mapping[str, Any]]: 取得したイベントデータのリスト。各行には距離(km)も含まれる。
+            行は読み取り専用のRowMappingで、キャッシュと共有されるため変更しないこと。
+    """
+    cache_key = _result_cache_key(target_lat, target_lon, radius_cap_km)
+    with _RESULT_CACHE_LOCK:
+        results_list = _RESULT_CACHE.get(cache_key)
+
+    if results_list is None:
+        query, params = _build_query(target_lat, target_lon, radius_cap_km)
+
+        try:
+            async with _get_async_engine().connect() as connection:
+                print(f"データベースに接続し、({target_lat}, {target_lon}) 周辺の急ブレーキデータを検索しています...")
+
+                result_proxy = await connection.execute(query, params)
+                results_list = result_proxy.mappings().all()
+        except OperationalError as e:
+            print(f"データベースへの接続に失敗しました: {e}")
+            return []
+        except Exception as e:
+            print(f"予期せぬエラーが発生しました: {e}")
+            return []
+
+        with _RESULT_CACHE_LOCK:
+            _RESULT_CACHE[cache_key] = results_list
+    else:
+        print(f"({target_lat}, {target_lon}) 周辺の急ブレーキデータをキャッシュから取得しました。")
+
+    _print_search_result(results_list, radius_cap_km)
     return results_list
 
 # --- このファイルが直接実行された場合のテストコード ---
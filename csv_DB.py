@@ -1,100 +1,127 @@
 # csv_DB.py
 
-import os
-from dotenv import load_dotenv
-from sqlalchemy import create_engine, text
+import hashlib
+import threading
+import numpy as np
+from cachetools import TTLCache
+from sqlalchemy import text, bindparam, Float, String
 from sqlalchemy.exc import OperationalError
-from typing import List, Dict, Any
-
-load_dotenv()
-
-def get_accident_data_from_postgres(points: List[List[float]], buffer_meters: float = 500.0) -> List[Dict[str, Any]]:
+from database import engine
+from typing import List, Any, Mapping, Sequence
+
+
+# database.pyのエンジンとコネクションプールを共有する。
+# 読み取り専用のSELECTしか発行しないため、AUTOCOMMITでBEGIN/COMMITの往復を省く。
+_ENGINE = engine.execution_options(isolation_level="AUTOCOMMIT")
+
+# --- 検索クエリ (モジュール読み込み時に一度だけ構築し、呼び出し間で使い回す) ---
+# 実際の日本語列名をASで英語の別名に変換し、事前計算済みのgeog列(GiSTインデックス付き)を参照する。
+# 通常検索と強制検索を1つの文にまとめ、ルートのWKT解析とDBへの往復を1回で済ませる。
+#   nearby:   ルートから :buffer_meters 以内のデータ (インデックス範囲検索)
+#   fallback: nearbyが0件の場合のみ、KNN演算子(<->)でルートに近い順に20件を取得
+# q は NOT MATERIALIZED で各参照先に展開させ、KNNの並び替えでもインデックスが使われるようにする。
+# GPSの密な点列は判定に寄与しないため、ST_Simplify (Douglas-Peucker) で頂点を間引いてから使う。
+_ACCIDENT_QUERY = text("""
+    WITH q AS NOT MATERIALIZED (
+        SELECT ST_Simplify(
+            ST_GeomFromText(:linestring, 4326),
+            :simplify_tolerance_deg,
+            true
+        )::geography AS route
+    ),
+    nearby AS (
+        SELECT
+            d.id,
+            d."緯度" AS latitude,
+            d."経度" AS longitude,
+            d."件数" AS count,
+            ST_Distance(d.geog, q.route) AS distance_m
+        FROM "CSV_data" AS d, q
+        WHERE ST_DWithin(d.geog, q.route, :buffer_meters)
+    ),
+    fallback AS (
+        SELECT
+            d.id,
+            d."緯度" AS latitude,
+            d."経度" AS longitude,
+            d."件数" AS count,
+            ST_Distance(d.geog, q.route) AS distance_m
+        FROM "CSV_data" AS d, q
+        WHERE NOT EXISTS (SELECT 1 FROM nearby)
+        ORDER BY d.geog <-> q.route
+        LIMIT 20
+    )
+    SELECT id, latitude, longitude, count, distance_m FROM nearby
+    UNION ALL
+    SELECT id, latitude, longitude, count, distance_m FROM fallback;
+""").bindparams(
+    bindparam("linestring", type_=String),
+    bindparam("simplify_tolerance_deg", type_=Float),
+    bindparam("buffer_meters", type_=Float)
+)
+
+# ルート簡略化の許容誤差 (検索半径に対する割合) と、1度あたりのおおよその距離(m)
+_SIMPLIFY_TOLERANCE_RATIO = 0.1
+_METERS_PER_DEGREE = 111320.0
+
+# 同じ(またはほぼ同じ)ルートでの再検索に備え、検索結果を一定時間キャッシュする。
+# キーは小数第4位 (約11m単位) に丸めた座標列のハッシュ値と検索半径。
+# 長いルートでも座標列そのものを保持せず、キー1件あたりのメモリを一定に保つ。
+_RESULT_CACHE: TTLCache = TTLCache(maxsize=4096, ttl=300)
+_RESULT_CACHE_LOCK = threading.Lock()
+
+def _result_cache_key(points: Sequence[Sequence[float]], buffer_meters: float) -> tuple:
+    """ ルートの座標列を約11m単位に丸めてハッシュ化したキャッシュキーを返す """
+    quantized_route = np.round(np.asarray(points, dtype=np.float64)[:, :2], 4)
+    route_digest = hashlib.blake2b(quantized_route.tobytes(), digest_size=16).digest()
+    return (route_digest, buffer_meters)
+
+def get_accident_data_from_postgres(points: Sequence[Sequence[float]], buffer_meters: float = 500.0) -> List[Mapping[str, Any]]:
     """
     PostgreSQL/PostGISを使い、ルート周辺の事故データを取得する。
     実際の日本語テーブル構造に合わせて修正済み。
 
     Args:
-        points (List[List[float]]): [[lat, lon], ...] の形式の座標リスト。
+        points (Sequence[Sequence[float]]): [[lat, lon], ...] の形式の座標リスト、または (N, 2) のNumPy配列。
         buffer_meters (float): 通常検索の範囲（半径）をメートル単位で指定。
 
     Returns:
-        List[Dict[str, Any]]: 取得した事故データのリスト。
+        List[Mapping[str, Any]]: 取得した事故データのリスト。各行にはルートからの距離(m)も含まれる。
+            行は読み取り専用のRowMappingで、キャッシュと共有されるため変更しないこと。
     """
-    database_url = os.getenv("DATABASE_URL")
-    if not database_url:
-        print("エラー: .envファイルにDATABASE_URLが設定されていません。")
+    if len(points) < 2:
         return []
 
-    if not points or len(points) < 2:
-        return []
+    cache_key = _result_cache_key(points, buffer_meters)
+    with _RESULT_CACHE_LOCK:
+        cached_results = _RESULT_CACHE.get(cache_key)
+    if cached_results is not None:
+        print(f"ルート周辺（半径{buffer_meters}m）の事故データをキャッシュから取得しました。")
+        return cached_results
 
     linestring_wkt = "LINESTRING(" + ", ".join(f"{p[1]} {p[0]}" for p in points) + ")"
 
-    # --- ▼▼▼ ここからが修正箇所 ▼▼▼ ---
-
-    # クエリ1: 通常検索用。実際の日本語列名に修正し、ASで英語の別名を設定。
-    nearby_query = text("""
-        SELECT
-            id,
-            "緯度" AS latitude,
-            "経度" AS longitude,
-            "件数" AS count
-        FROM "CSV_data"
-        WHERE ST_DWithin(
-            ST_MakePoint("経度", "緯度")::geography,
-            ST_GeomFromText(:linestring, 4326)::geography,
-            :buffer_meters
-        );
-    """)
-
-    # クエリ2: 強制検索用。こちらも同様に修正。
-    fallback_query = text("""
-        SELECT
-            id,
-            "緯度" AS latitude,
-            "経度" AS longitude,
-            "件数" AS count,
-            ST_Distance(
-                ST_MakePoint("経度", "緯度")::geography,
-                ST_GeomFromText(:linestring, 4326)::geography
-            ) AS distance_m
-        FROM "CSV_data"
-        ORDER BY distance_m ASC
-        LIMIT 20;
-    """)
-    
-    # --- ▲▲▲ ここまでが修正箇所 ▲▲▲ ---
-
     results_list = []
     try:
-        engine = create_engine(database_url)
-        with engine.connect() as connection:
-            # フェーズ1: 通常検索
+        with _ENGINE.connect() as connection:
             print(f"PostGISを使用して、ルート周辺（半径{buffer_meters}m）のデータを 'CSV_data' テーブルから検索しています...")
-            
-            result_proxy = connection.execute(nearby_query, {
+
+            result_proxy = connection.execute(_ACCIDENT_QUERY, {
                 "linestring": linestring_wkt,
+                "simplify_tolerance_deg": buffer_meters * _SIMPLIFY_TOLERANCE_RATIO / _METERS_PER_DEGREE,
                 "buffer_meters": buffer_meters
             })
-            results_list = [dict(row._mapping) for row in result_proxy]
-            
-            print(f"{len(results_list)}件のデータを取得しました。")
+            results_list = result_proxy.mappings().all()
 
-            # フェーズ2: 結果が0件なら強制検索
+            # 強制検索の結果は、すべて通常検索の範囲より遠いデータになる
             if not results_list:
+                print(" -> 'CSV_data' テーブルにデータが1件も存在しませんでした。")
+            elif results_list[0]['distance_m'] <= buffer_meters:
+                print(f"{len(results_list)}件のデータを取得しました。")
+            else:
+                nearest_distance = results_list[0]['distance_m']
                 print(f" -> 半径 {buffer_meters}m 以内ではデータが見つかりませんでした。")
-                print(" -> 最終手段として、範囲を無制限に広げてデータベース全体を再検索します...")
-
-                fallback_result_proxy = connection.execute(fallback_query, {
-                    "linestring": linestring_wkt
-                })
-                results_list = [dict(row._mapping) for row in fallback_result_proxy]
-
-                if results_list:
-                    nearest_distance = results_list[0]['distance_m']
-                    print(f" -> 全範囲を検索し、最も近いデータ({nearest_distance:.0f} m先)を{len(results_list)}件見つけました。")
-                else:
-                    print(" -> 'CSV_data' テーブルにデータが1件も存在しませんでした。")
+                print(f" -> 全範囲を検索し、最も近いデータ({nearest_distance:.0f} m先)を{len(results_list)}件見つけました。")
 
     except OperationalError as e:
         print(f"データベースへの接続に失敗しました: {e}")
@@ -103,4 +130,7 @@ def get_accident_data_from_postgres(points: List[List[float]], buffer_meters: fl
         print(f"データ検索中に予期せぬエラーが発生しました: {e}")
         return []
 
+    with _RESULT_CACHE_LOCK:
+        _RESULT_CACHE[cache_key] = results_list
+
     return results_list
\ No newline at end of file
@@ -4,13 +4,24 @@ from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 from dotenv import load_dotenv
 
-# .envファイルから環境変数を読み込む
+# .envファイルから環境変数を読み込む (DB関連の設定はこのモジュールでのみ読み込む)
 load_dotenv()
 
 DATABASE_URL = os.getenv("DATABASE_URL")
 
+# 接続先の設定漏れは、各検索処理の呼び出し時ではなく起動時に一度だけ検出する
+if not DATABASE_URL:
+    raise RuntimeError("DATABASE_URLが設定されていません。.envファイルまたは環境変数を確認してください。")
+
 # データベースエンジンを作成
-engine = create_engine(DATABASE_URL)
+# プロセス全体で1つだけ作成し、各モジュールはこのエンジンのコネクションプールを共有する
+engine = create_engine(
+    DATABASE_URL,
+    pool_size=10,
+    max_overflow=20,
+    pool_pre_ping=True,
+    pool_recycle=1800
+)
 
 # データベースセッションを作成するためのクラス
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
@@ -2,7 +2,7 @@
 
 import os
 from dotenv import load_dotenv
-from sqlalchemy import create_engine, Column, Integer, String
+from sqlalchemy import create_engine, text, Column, Integer, String
 from sqlalchemy.orm import declarative_base, sessionmaker
 from sqlalchemy.exc import OperationalError
 
@@ -20,6 +20,30 @@ class User(Base):
     name = Column(String(50), unique=True)
     email = Column(String(100))
 
+# 近傍検索用の空間インデックス (PostGIS)
+# 緯度・経度から geography 列を自動生成し、GiSTインデックスでKNN検索(<->)を高速化する
+# ※ braking_data_handler.py / csv_DB.py の検索クエリは geog 列を前提としているため、
+#    新しいバージョンをデプロイする前に、必ずこのスクリプトを実行してマイグレーションを済ませること。
+# テーブルごとに (テーブル名, DDLのリスト) をまとめ、存在するテーブルにだけ個別のトランザクションで適用する
+SPATIAL_INDEX_DDL = [
+    ("BrakingEvents", [
+        """
+        ALTER TABLE "BrakingEvents"
+        ADD COLUMN IF NOT EXISTS geog geography(Point, 4326)
+        GENERATED ALWAYS AS (ST_SetSRID(ST_MakePoint(longitude, latitude), 4326)::geography) STORED
+        """,
+        'CREATE INDEX IF NOT EXISTS braking_events_geog_gix ON "BrakingEvents" USING GIST (geog)',
+    ]),
+    ("CSV_data", [
+        """
+        ALTER TABLE "CSV_data"
+        ADD COLUMN IF NOT EXISTS geog geography(Point, 4326)
+        GENERATED ALWAYS AS (ST_SetSRID(ST_MakePoint("経度", "緯度"), 4326)::geography) STORED
+        """,
+        'CREATE INDEX IF NOT EXISTS csv_data_geog_gix ON "CSV_data" USING GIST (geog)',
+    ]),
+]
+
 print("データベースに接続しています...")
 
 try:
@@ -33,6 +57,22 @@ try:
     Base.metadata.create_all(bind=engine)
     print("✅ テーブルの準備が完了しました。")
 
+    print("空間インデックスを作成しています...")
+    with engine.begin() as ddl_connection:
+        ddl_connection.execute(text('CREATE EXTENSION IF NOT EXISTS postgis'))
+    for table_name, statements in SPATIAL_INDEX_DDL:
+        # BrakingEvents / CSV_data はこのスクリプトでは作成しないため、まだ存在しない場合はスキップする
+        with engine.begin() as ddl_connection:
+            table_exists = ddl_connection.execute(
+                text("SELECT to_regclass(:table_name) IS NOT NULL"), {"table_name": f'"{table_name}"'}
+            ).scalar()
+            if not table_exists:
+                print(f"⚠️ テーブル \"{table_name}\" が存在しないため、空間インデックスの作成をスキップしました。")
+                continue
+            for statement in statements:
+                ddl_connection.execute(text(statement))
+        print(f"✅ \"{table_name}\" の空間インデックスの準備が完了しました。")
+
     SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
     db = SessionLocal()
 
@@ -1,21 +1,70 @@
 # main.py
 
+import asyncio
 import uvicorn
+import orjson
+import numpy as np
+from decimal import Decimal
 from fastapi import FastAPI, HTTPException
-from pydantic import BaseModel
-from typing import List, Dict, Any
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel, Field, field_validator
+from typing import Any, Mapping
 import traceback
 
 # 各機能を提供するモジュールから関数をインポート
 from weather_simulator import simulate_journey_and_get_weather
 from csv_DB import get_accident_data_from_postgres
-from braking_data_handler import get_nearest_braking_events
+from braking_data_handler import get_nearest_braking_events_async
 
 # --- Pydanticモデルの定義 ---
 class RouteData(BaseModel):
     """フロントエンドから受け取る経路データの形式"""
-    # [[lat, lon, elapsed_seconds], ...] の形式を受け取る
-    points: List[List[float]]
+    # [[lat, lon, elapsed_seconds], ...] の形式を受け取り、float64のNumPy配列として保持する
+    # (型はAnyだが、OpenAPIスキーマには数値3つの配列の配列として公開する)
+    points: Any = Field(
+        json_schema_extra={
+            "type": "array",
+            "items": {"type": "array", "items": {"type": "number"}, "minItems": 3, "maxItems": 3},
+        }
+    )
+
+    @field_validator('points')
+    @classmethod
+    def _points_to_array(cls, value: Any) -> np.ndarray:
+        """ 要素ごとの検証を行わず、np.asarrayで一括して数値配列に変換してから形と値をまとめて検証する """
+        try:
+            points = np.asarray(value, dtype=np.float64)
+        except (TypeError, ValueError) as e:
+            raise ValueError("経路データは数値の二次元配列である必要があります。") from e
+
+        # 空の経路はエンドポイント側で400として扱う
+        if points.size == 0:
+            return points
+        if points.ndim != 2 or points.shape[1] != 3:
+            raise ValueError("各地点のデータは [緯度, 経度, 経過秒数] の形式である必要があります。")
+        # JSONのnullはNaNに変換されてしまうため、NaN/無限大を含む入力はここで拒否する
+        if not np.isfinite(points).all():
+            raise ValueError("経路データに数値以外の値 (null など) が含まれています。")
+        return points
+
+# --- レスポンスの定義 ---
+def _orjson_default(obj: Any) -> Any:
+    """ orjsonが直接扱えない値 (DBのRowMappingやDecimal) をJSON化できる型に変換する """
+    if isinstance(obj, Mapping):
+        return dict(obj)
+    if isinstance(obj, Decimal):
+        return float(obj)
+    raise TypeError
+
+class ORJSONResponse(JSONResponse):
+    """
+    orjsonでシリアライズするレスポンス。
+    FastAPIのjsonable_encoderによる全体の変換は省略する。
+    ただしorjsonは辞書以外のMappingを直接扱えないため、DBモジュールが返すRowMappingは
+    _orjson_defaultで1行ごとに辞書へ変換してから書き出す。
+    """
+    def render(self, content: Any) -> bytes:
+        return orjson.dumps(content, default=_orjson_default, option=orjson.OPT_SERIALIZE_NUMPY)
 
 # --- FastAPIアプリケーションのインスタンスを作成 ---
 app = FastAPI(
@@ -24,53 +73,54 @@ app = FastAPI(
 )
 
 # --- APIエンドポイントの定義 ---
-@app.post("/weather/simulation", summary="天気と事故・急ブレーキ情報のシミュレーション")
-async def run_weather_simulation(route_data: RouteData) -> Dict[str, Any]:
+@app.post("/weather/simulation", summary="天気と事故・急ブレーキ情報のシミュレーション", response_class=ORJSONResponse)
+async def run_weather_simulation(route_data: RouteData) -> ORJSONResponse:
     """
     フロントエンドから経路データを受け取り、以下の処理を実行して結果を返す。
     1. ルート上の各地点の天気情報をシミュレーションする。
     2. ルート周辺の事故データをデータベースから取得する。
     3. ルートの開始地点周辺の急ブレーキデータを取得する。
     """
-    if not route_data.points:
+    # 形式 ([緯度, 経度, 経過秒数]) と値の検証はRouteDataのバリデータで済んでいる
+    if route_data.points.size == 0:
         raise HTTPException(status_code=400, detail="経路データが空です。")
 
-    # 入力データが [緯度, 経度, 時間] の3つの要素を持っているか確認
-    if len(route_data.points[0]) != 3:
-        raise HTTPException(status_code=400, detail="各地点のデータは [緯度, 経度, 経過秒数] の形式である必要があります。")
-
     print(f"POST /weather/simulation: {len(route_data.points)} 地点のシミュレーションを開始します。")
 
     try:
-        # 1. 天気シミュレーションを実行
-        weather_report = simulate_journey_and_get_weather(
-            ordered_route_data_with_time=route_data.points
-        )
+        points_lat_lon = route_data.points[:, :2]
+        start_lat, start_lon = route_data.points[0, 0].item(), route_data.points[0, 1].item()
 
+        # 以下の3つの処理は互いに独立したI/O待ちなので、並行して実行する
+        # (天気と事故データはスレッドプールで、急ブレーキデータはasyncpgでこのイベントループ上で待機する)
+        # 1. 天気シミュレーションを実行
         # 2. ルート周辺の事故データを取得
-        print("データベースからルート周辺の事故データを検索します...")
-        points_lat_lon = [[p[0], p[1]] for p in route_data.points]
-        nearby_accident_data = get_accident_data_from_postgres(
-            points=points_lat_lon,
-            buffer_meters=500.0  # 半径500m
-        )
-
         # 3. ルートの開始地点周辺の急ブレーキデータを取得
-        print("データベースからルート開始地点周辺の急ブレーキデータを検索します...")
-        start_point = route_data.points[0]
-        start_lat, start_lon = start_point[0], start_point[1]
-        nearby_braking_events = get_nearest_braking_events(
-            target_lat=start_lat,
-            target_lon=start_lon
+        print("天気シミュレーション、事故データ検索、急ブレーキデータ検索を並行して実行します...")
+        weather_report, nearby_accident_data, nearby_braking_events = await asyncio.gather(
+            asyncio.to_thread(
+                simulate_journey_and_get_weather,
+                ordered_route_data_with_time=route_data.points
+            ),
+            asyncio.to_thread(
+                get_accident_data_from_postgres,
+                points=points_lat_lon,
+                buffer_meters=500.0  # 半径500m
+            ),
+            get_nearest_braking_events_async(
+                target_lat=start_lat,
+                target_lon=start_lon
+            )
         )
 
         # 4. 全ての結果を統合してレスポンスとして返す
-        return {
+        # (FastAPIのjsonable_encoderを通さず、orjsonで直接シリアライズする)
+        return ORJSONResponse({
             "status": "success",
             "report": weather_report,
             "nearby_accident_data": nearby_accident_data,
             "nearby_braking_events": nearby_braking_events
-        }
+        })
     except Exception as e:
         print(f"サーバー内部でエラーが発生しました: {e}")
         traceback.print_exc()
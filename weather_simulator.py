@@ -1,49 +1,177 @@
 import os
-import requests
+import random
+import asyncio
+import threading
+import aiohttp
+import orjson
 import numpy as np
+from cachetools import Cache, LRUCache, TTLCache
 from datetime import datetime, timezone, timedelta
-import time
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Tuple
 from dotenv import load_dotenv
 
 # モジュール読み込み時に一度だけ環境変数をロード
 load_dotenv()
 
-def haversine(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
-    """ Calculate distance (km) between two lat/lon points using Haversine formula """
-    R = 6371  # Earth radius (km)
-    lat1_rad, lon1_rad, lat2_rad, lon2_rad = map(np.radians, [lat1, lon1, lat2, lon2])
-    dlon = lon2_rad - lon1_rad
-    dlat = lat2_rad - lat1_rad
-    a = np.sin(dlat / 2)**2 + np.cos(lat1_rad) * np.cos(lat2_rad) * np.sin(dlon / 2)**2
-    c = 2 * np.arctan2(np.sqrt(a), np.sqrt(1 - a))
-    return R * c
+_EARTH_RADIUS_KM = 6371
+
+_YAHOO_BASE_URL = "https://map.yahooapis.jp/weather/V1/place"
+_YAHOO_BASE_PARAMS = {"output": "json", "interval": "10"}
+# Yahoo! weather dates are Japan Standard Time (UTC+9)
+_JST_OFFSET_S = 9 * 3600
+# Max number of Open-Meteo requests in flight at once, and locations per multi-location request (keeps the URL short)
+_OPEN_METEO_CONCURRENCY = 10
+_OPEN_METEO_BATCH_SIZE = 50
+# Max number of Yahoo! requests (chunks of up to 10 points) in flight at once
+_YAHOO_CONCURRENCY = 5
+# Query parameters shared by every Open-Meteo request.
+# Times come back as UTC epoch seconds, and start_date/end_date are UTC dates (the default GMT timezone).
+_OPEN_METEO_BASE_PARAMS = {'hourly': 'temperature_2m,weather_code', 'timeformat': 'unixtime'}
+_HTTP_TIMEOUT = aiohttp.ClientTimeout(total=10)
+
+# Open-Meteo retry policy: transient errors only, exponential backoff (0.5s, 1s, ... capped at 8s) with jitter
+_OPEN_METEO_MAX_ATTEMPTS = 3
+_RETRY_BASE_DELAY_S = 0.5
+_RETRY_MAX_DELAY_S = 8.0
+_RETRYABLE_STATUSES = frozenset({429, 500, 502, 503, 504})
+
+# Weather only changes hourly, so reruns of the same (or a nearby) route reuse recent API responses.
+# Keys are rounded to 0.01 deg (~1 km). Forecasts expire after 10 minutes. Archive data for the last few days can still be
+# revised, so it is kept for 24 hours; older archive data never changes, so it is kept until evicted (LRU, no expiry).
+# Yahoo! nowcasts are in 10-minute steps, so they are keyed by 10-minute slot and also kept for 10 minutes.
+_FORECAST_CACHE: TTLCache = TTLCache(maxsize=4096, ttl=600)
+_ARCHIVE_CACHE: TTLCache = TTLCache(maxsize=4096, ttl=86400)
+_FINAL_ARCHIVE_CACHE: LRUCache = LRUCache(maxsize=8192)
+_ARCHIVE_FINAL_AFTER_S = 7 * 86400
+_YAHOO_CACHE: TTLCache = TTLCache(maxsize=1024, ttl=600)
+_WEATHER_CACHE_LOCK = threading.Lock()
+
+def _open_meteo_cache_key(point: Dict) -> tuple:
+    """ Cache key for one Open-Meteo lookup: the point rounded to ~1 km and to the hour """
+    # Round to the nearest hour (earlier hour on ties) so the key names the same hour _nearest_hour_index selects
+    return (round(point['lat'], 2), round(point['lon'], 2), (point['timestamp'] + 1799) // 3600)
+
+def _open_meteo_cache(timestamp: int, today_start_epoch: int) -> Cache:
+    """ Cache holding Open-Meteo results for a point at this timestamp (forecast, recent archive or final archive) """
+    if timestamp >= today_start_epoch:
+        return _FORECAST_CACHE
+    if timestamp < today_start_epoch - _ARCHIVE_FINAL_AFTER_S:
+        return _FINAL_ARCHIVE_CACHE
+    return _ARCHIVE_CACHE
+
+def _yahoo_cache_key(chunk: List[Dict]) -> tuple:
+    """ Cache key for one Yahoo! request: every point of the chunk rounded to ~1 km and 10 minutes """
+    # Round to the nearest 10-minute slot (earlier slot on ties), matching the forecast _nearest_time_index selects
+    return tuple((round(p['lat'], 2), round(p['lon'], 2), (p['timestamp'] + 299) // 600) for p in chunk)
+
+def _segment_distances_km(lats: np.ndarray, lons: np.ndarray) -> np.ndarray:
+    """ Haversine distance (km) between consecutive route points, computed in one vectorized pass """
+    lat_rad = np.radians(lats)
+    lon_rad = np.radians(lons)
+    # Each point's cos(lat) is shared by the two segments touching it, so evaluate it once per point
+    cos_lat = np.cos(lat_rad)
+    dlat = np.diff(lat_rad)
+    dlon = np.diff(lon_rad)
+    a = np.sin(dlat / 2)**2 + cos_lat[:-1] * cos_lat[1:] * np.sin(dlon / 2)**2
+    # 2R*asin(sqrt(a)) equals 2R*atan2(sqrt(a), sqrt(1-a)) but needs one less sqrt and a cheaper inverse trig call
+    return 2 * _EARTH_RADIUS_KM * np.arcsin(np.sqrt(a))
+
+def _route_distances_km(route_arr: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """ Segment lengths and cumulative distance from the start (km) for an (N, >=2) lat/lon array """
+    segment_km = _segment_distances_km(route_arr[:, 0], route_arr[:, 1])
+    cumulative_km = np.concatenate(([0.0], np.cumsum(segment_km)))
+    return segment_km, cumulative_km
+
+def _yahoo_dates_to_epochs(dates: List[str]) -> np.ndarray:
+    """ Convert Yahoo! 'YYYYMMDDHHMM' JST date strings into UTC epoch seconds """
+    iso_dates = [f"{d[:4]}-{d[4:6]}-{d[6:8]}T{d[8:10]}:{d[10:12]}" for d in dates]
+    return np.array(iso_dates, dtype='datetime64[s]').astype(np.int64) - _JST_OFFSET_S
+
+def _nearest_time_index(sorted_epochs: np.ndarray, target_epoch: float) -> int:
+    """ Index of the entry in an ascending epoch-seconds array closest to target_epoch (earlier entry wins ties) """
+    i = int(np.searchsorted(sorted_epochs, target_epoch))
+    if i == 0:
+        return 0
+    if i == len(sorted_epochs):
+        return i - 1
+    return i - 1 if target_epoch - sorted_epochs[i - 1] <= sorted_epochs[i] - target_epoch else i
+
+def _nearest_hour_index(first_epoch: int, n_hours: int, target_epoch: int) -> int:
+    """ Index of the closest entry in an hourly series starting at first_epoch (earlier hour wins ties) """
+    closest_time_idx = (target_epoch - first_epoch + 1799) // 3600
+    return min(max(closest_time_idx, 0), n_hours - 1)
 
 # --- Category translation function ---
-def wmo_code_to_description(code: int) -> str:
-    """ Convert Open-Meteo WMO code into 3 categories: Sunny, Cloudy, Rain """
+# Open-Meteo WMO code -> 3 categories, built once at import
+_WMO_CATEGORY: Dict[int, str] = {
     # Category 1: Sunny
-    if code in [0, 1]:
-        return 'Sunny'
+    **{code: 'Sunny' for code in (0, 1)},
     # Category 2: Cloudy (including fog)
-    elif code in [2, 3, 45, 48]:
-        return 'Cloudy'
+    **{code: 'Cloudy' for code in (2, 3, 45, 48)},
     # Category 3: Rain (including drizzle, snow, thunderstorms)
-    elif code in [
+    **{code: 'Rain' for code in (
         51, 53, 55,  # Drizzle
         61, 63, 65,  # Rain
         71, 73, 75,  # Snow
         80, 81, 82,  # Showers
         95, 96, 99   # Thunderstorm
-    ]:
-        return 'Rain'
+    )},
+}
+
+def wmo_code_to_description(code: int) -> str:
+    """ Convert Open-Meteo WMO code into 3 categories: Sunny, Cloudy, Rain """
     # Default: treat unknown codes as Cloudy
-    else:
-        return 'Cloudy'
+    return _WMO_CATEGORY.get(code, 'Cloudy')
+
+async def _fetch_yahoo_chunk(session: aiohttp.ClientSession, chunk: List[Dict], api_key: str, sem: asyncio.Semaphore) -> None:
+    """ [Yahoo! API] Fill in weather for one chunk of up to 10 points (one request per chunk) """
+    cache_key = _yahoo_cache_key(chunk)
+    with _WEATHER_CACHE_LOCK:
+        cached_weather = _YAHOO_CACHE.get(cache_key)
+    if cached_weather is not None:
+        # Copy each dict: the report step adds temperature to point['weather'] in place
+        for point, weather in zip(chunk, cached_weather):
+            point['weather'] = dict(weather)
+        return
+
+    coordinate_str = " ".join(f"{p['lon']},{p['lat']}" for p in chunk)
+    params = {**_YAHOO_BASE_PARAMS, "coordinates": coordinate_str, "appid": api_key}
 
-def _get_weather_for_points_yahoo(points: List[Dict]) -> List[Dict]:
-    """ [Yahoo! API] Get weather summary and rainfall for multiple points """
-    base_url = "https://map.yahooapis.jp/weather/V1/place"
+    try:
+        # The semaphore caps in-flight requests: every chunk shares one appid on a rate-limited API
+        async with sem:
+            async with session.get(_YAHOO_BASE_URL, params=params) as response:
+                response.raise_for_status()
+                # A non-JSON body raises orjson.JSONDecodeError (a ValueError), handled below like a failed request
+                weather_data = orjson.loads(await response.read())
+
+        if 'Feature' not in weather_data:
+            raise ValueError("API response does not contain 'Feature' key.")
+
+        for point, weather_feature in zip(chunk, weather_data.get('Feature', [])):
+            all_forecasts = weather_feature.get('Property', {}).get('WeatherList', {}).get('Weather', [])
+            if not all_forecasts:
+                point['weather'] = {'description': 'No forecast', 'rainfall_mm_h': None}
+                continue
+
+            # Forecasts are listed in time order; parse all Dates (JST, YYYYMMDDHHMM) in one NumPy call and binary-search for the closest one
+            forecast_epochs = _yahoo_dates_to_epochs([f['Date'] for f in all_forecasts])
+            best_forecast = all_forecasts[_nearest_time_index(forecast_epochs, point['timestamp'])]
+            rainfall = best_forecast.get('Rainfall', 0.0)
+            point['weather'] = {
+                # Yahoo API only indicates presence of precipitation. "No rain" will be refined later by Open-Meteo.
+                'description': "Rain" if rainfall > 0 else "No rain",
+                'rainfall_mm_h': rainfall,
+            }
+        with _WEATHER_CACHE_LOCK:
+            _YAHOO_CACHE[cache_key] = [dict(point['weather']) for point in chunk]
+    except (aiohttp.ClientError, asyncio.TimeoutError, ValueError) as e:
+        print(f"Warning: Failed to fetch data from Yahoo! Weather API: {e}")
+        for point in chunk:
+            point['weather'] = {'description': 'No forecast', 'rainfall_mm_h': None}
+
+async def _get_weather_for_points_yahoo(session: aiohttp.ClientSession, points: List[Dict]) -> List[Dict]:
+    """ [Yahoo! API] Get weather summary and rainfall for multiple points (all chunks requested concurrently) """
     api_key = os.getenv("YAHOO_API_KEY")
     if not api_key:
         print("Warning: YAHOO_API_KEY is not set. Skipping Yahoo! API processing.")
@@ -52,102 +180,139 @@ def _get_weather_for_points_yahoo(points: List[Dict]) -> List[Dict]:
         return points
 
     chunk_size = 10
-    for i in range(0, len(points), chunk_size):
-        chunk = points[i:i + chunk_size]
-        coordinate_str = " ".join(f"{p['lon']},{p['lat']}" for p in chunk)
-        params = {"coordinates": coordinate_str, "output": "json", "appid": api_key, "interval": "10"}
-
-        try:
-            response = requests.get(base_url, params=params, timeout=10)
-            response.raise_for_status()
-            weather_data = response.json()
-
-            if 'Feature' not in weather_data:
-                raise ValueError("API response does not contain 'Feature' key.")
-
-            for point, weather_feature in zip(chunk, weather_data.get('Feature', [])):
-                all_forecasts = weather_feature.get('Property', {}).get('WeatherList', {}).get('Weather', [])
-                if not all_forecasts:
-                    point['weather'] = {'description': 'No forecast', 'rainfall_mm_h': None}
-                    continue
-
-                best_forecast = min(
-                    all_forecasts,
-                    key=lambda f: abs(point['timestamp'] - datetime.strptime(f['Date'], '%Y%m%d%H%M').timestamp())
-                )
-                rainfall = best_forecast.get('Rainfall', 0.0)
-                point['weather'] = {
-                    # Yahoo API only indicates presence of precipitation. "No rain" will be refined later by Open-Meteo.
-                    'description': "Rain" if rainfall > 0 else "No rain",
-                    'rainfall_mm_h': rainfall,
-                }
-        except requests.exceptions.RequestException as e:
-            print(f"Warning: Failed to fetch data from Yahoo! Weather API: {e}")
-            for point in chunk:
-                point['weather'] = {'description': 'No forecast', 'rainfall_mm_h': None}
+    sem = asyncio.Semaphore(_YAHOO_CONCURRENCY)
+    await asyncio.gather(*(
+        _fetch_yahoo_chunk(session, points[i:i + chunk_size], api_key, sem)
+        for i in range(0, len(points), chunk_size)
+    ))
     return points
 
-def _get_open_meteo_data(point: Dict) -> Dict[str, Any] or None:
-    """ [Open-Meteo API] Get temperature and weather code (with retry) """
-    dt_object_utc = datetime.fromtimestamp(point['timestamp'], tz=timezone.utc)
-    is_past = dt_object_utc.date() < datetime.now(timezone.utc).date()
-    
+async def _get_open_meteo_batch(session: aiohttp.ClientSession, points: List[Dict], is_past: bool, sem: asyncio.Semaphore) -> List[Dict[str, Any] or None]:
+    """ [Open-Meteo API] Get temperature and weather code for several points in one multi-location request (with retry) """
     base_url = "https://archive-api.open-meteo.com/v1/archive" if is_past else "https://api.open-meteo.com/v1/forecast"
-    params = {'latitude': point['lat'], 'longitude': point['lon'], 'hourly': 'temperature_2m,weather_code', 'timezone': 'auto'}
+    params = {
+        **_OPEN_METEO_BASE_PARAMS,
+        'latitude': ','.join(str(p['lat']) for p in points),
+        'longitude': ','.join(str(p['lon']) for p in points),
+    }
     if is_past:
-        date_str = dt_object_utc.strftime('%Y-%m-%d')
-        params.update({'start_date': date_str, 'end_date': date_str})
+        # One date range covering every point of the batch; only its two ends are formatted
+        timestamps = [p['timestamp'] for p in points]
+        params.update({
+            'start_date': datetime.fromtimestamp(min(timestamps), tz=timezone.utc).strftime('%Y-%m-%d'),
+            'end_date': datetime.fromtimestamp(max(timestamps), tz=timezone.utc).strftime('%Y-%m-%d'),
+        })
 
-    for attempt in range(3):
+    for attempt in range(_OPEN_METEO_MAX_ATTEMPTS):
         try:
-            response = requests.get(base_url, params=params, timeout=10)
-            response.raise_for_status()
-            weather_data = response.json()
-            
-            hourly = weather_data.get('hourly', {})
-            api_times_str = hourly.get('time', [])
-            if not api_times_str: return None
-            
-            api_times = [datetime.fromisoformat(t) for t in api_times_str]
-            target_dt = datetime.fromtimestamp(point['timestamp'], tz=api_times[0].tzinfo)
-
-            closest_time_idx = min(range(len(api_times)), key=lambda i: abs(api_times[i] - target_dt))
-            
-            return {
-                'temperature': hourly['temperature_2m'][closest_time_idx],
-                'description': wmo_code_to_description(hourly['weather_code'][closest_time_idx])
-            }
-        except requests.exceptions.RequestException as e:
-            if attempt == 2:
+            # The semaphore caps in-flight requests so a long route does not burst past the API rate limit
+            async with sem:
+                async with session.get(base_url, params=params) as response:
+                    response.raise_for_status()
+                    # A non-JSON body raises orjson.JSONDecodeError (a ValueError), handled below like a failed request
+                    weather_data = orjson.loads(await response.read())
+            break
+        except (aiohttp.ClientError, asyncio.TimeoutError, ValueError) as e:
+            retryable = not isinstance(e, aiohttp.ClientResponseError) or e.status in _RETRYABLE_STATUSES
+            if attempt == _OPEN_METEO_MAX_ATTEMPTS - 1 or not retryable:
                 print(f"Error: Failed to fetch data from Open-Meteo API: {e}")
-                return None
-            time.sleep(1)
-    return None
+                return [None] * len(points)
+            # Exponential backoff with full jitter, so concurrent batches do not retry in lockstep
+            await asyncio.sleep(random.uniform(0, min(_RETRY_MAX_DELAY_S, _RETRY_BASE_DELAY_S * 2 ** attempt)))
+
+    # A single location comes back as one object, several locations as a list in request order
+    locations = weather_data if isinstance(weather_data, list) else [weather_data]
+    results = []
+    for point, location in zip(points, locations):
+        hourly = location.get('hourly', {})
+        api_times = hourly.get('time', [])
+        if not api_times:
+            results.append(None)
+            continue
+
+        # Hourly epoch times are evenly spaced one hour apart, so the closest hour is found arithmetically
+        closest_time_idx = _nearest_hour_index(api_times[0], len(api_times), point['timestamp'])
+        results.append({
+            'temperature': hourly['temperature_2m'][closest_time_idx],
+            'description': wmo_code_to_description(hourly['weather_code'][closest_time_idx])
+        })
+    results.extend([None] * (len(points) - len(results)))
+    return results
+
+async def _get_open_meteo_for_points(session: aiohttp.ClientSession, points: List[Dict]) -> List[Dict[str, Any] or None]:
+    """ [Open-Meteo API] Get temperature and weather for multiple points, batching uncached points per endpoint """
+    # Start of today (UTC) in epoch seconds; anything before it is served by the archive API
+    today_start_epoch = int(datetime.now(timezone.utc).timestamp()) // 86400 * 86400
+    results: List[Dict[str, Any] or None] = [None] * len(points)
+    # Uncached points grouped by cache key: dense routes put many points in the same ~1 km cell and hour,
+    # so only one representative per key is requested and its result is shared by the whole group
+    pending: Dict[bool, Dict[tuple, List[int]]] = {True: {}, False: {}}
+
+    for i, point in enumerate(points):
+        is_past = point['timestamp'] < today_start_epoch
+        cache_key = _open_meteo_cache_key(point)
+        with _WEATHER_CACHE_LOCK:
+            results[i] = _open_meteo_cache(point['timestamp'], today_start_epoch).get(cache_key)
+        if results[i] is None:
+            pending[is_past].setdefault(cache_key, []).append(i)
+
+    batches = []
+    for is_past, groups in pending.items():
+        keys = list(groups)
+        batches.extend((is_past, keys[j:j + _OPEN_METEO_BATCH_SIZE]) for j in range(0, len(keys), _OPEN_METEO_BATCH_SIZE))
+
+    sem = asyncio.Semaphore(_OPEN_METEO_CONCURRENCY)
+    batch_results = await asyncio.gather(
+        *(
+            _get_open_meteo_batch(session, [points[pending[is_past][key][0]] for key in keys], is_past, sem)
+            for is_past, keys in batches
+        ),
+        return_exceptions=True,
+    )
+
+    for (is_past, keys), batch_result in zip(batches, batch_results):
+        if isinstance(batch_result, Exception):
+            print(f"Error: Failed to process Open-Meteo API response: {batch_result}")
+            continue
+        for key, result in zip(keys, batch_result):
+            indexes = pending[is_past][key]
+            for i in indexes:
+                results[i] = result
+            if result is not None:
+                with _WEATHER_CACHE_LOCK:
+                    _open_meteo_cache(points[indexes[0]]['timestamp'], today_start_epoch)[key] = result
+    return results
+
+async def _fetch_all_weather(points: List[Dict]) -> Tuple[List[Dict], List[Any]]:
+    """ Fetch Yahoo! and Open-Meteo data for every point concurrently over one shared HTTP session """
+    async with aiohttp.ClientSession(timeout=_HTTP_TIMEOUT) as session:
+        points_with_base_weather, open_meteo_results = await asyncio.gather(
+            _get_weather_for_points_yahoo(session, points),
+            _get_open_meteo_for_points(session, points),
+        )
+    return points_with_base_weather, open_meteo_results
 
 def _sample_route_by_distance(route_data_with_timestamps: List, interval_km: float) -> List[Dict]:
     """ Sample route at regular distance intervals """
-    if not route_data_with_timestamps: return []
-    
-    sampled_points = []
-    cumulative_distance = 0.0
-    next_sample_distance = interval_km
-    
-    first_point = route_data_with_timestamps[0]
-    sampled_points.append({'lat': first_point[0], 'lon': first_point[1], 'timestamp': int(first_point[2]), 'distance_km': 0.0})
+    if len(route_data_with_timestamps) == 0: return []
     
-    for i in range(1, len(route_data_with_timestamps)):
-        prev_pt, curr_pt = route_data_with_timestamps[i-1], route_data_with_timestamps[i]
-        distance = haversine(prev_pt[0], prev_pt[1], curr_pt[0], curr_pt[1])
-        
-        while cumulative_distance + distance >= next_sample_distance:
-            fraction = (next_sample_distance - cumulative_distance) / distance
-            interp_lat = prev_pt[0] + fraction * (curr_pt[0] - prev_pt[0])
-            interp_lon = prev_pt[1] + fraction * (curr_pt[1] - prev_pt[1])
-            interp_ts = prev_pt[2] + fraction * (curr_pt[2] - prev_pt[2])
-            
-            sampled_points.append({'lat': interp_lat, 'lon': interp_lon, 'timestamp': int(interp_ts), 'distance_km': round(next_sample_distance, 2)})
-            next_sample_distance += interval_km
-        cumulative_distance += distance
+    route_arr = np.asarray(route_data_with_timestamps, dtype=np.float64)
+    first_point = route_arr[0]
+    sampled_points = [{'lat': float(first_point[0]), 'lon': float(first_point[1]), 'timestamp': int(first_point[2]), 'distance_km': 0.0}]
+    if len(route_arr) < 2: return sampled_points
+
+    segment_km, cumulative_km = _route_distances_km(route_arr)
+
+    # Every multiple of interval_km along the route, located on its segment by binary search instead of a per-segment loop
+    targets = interval_km * np.arange(1, int(cumulative_km[-1] // interval_km) + 1)
+    seg_idx = np.minimum(np.searchsorted(cumulative_km, targets, side='left') - 1, len(segment_km) - 1)
+    fraction = (targets - cumulative_km[seg_idx]) / segment_km[seg_idx]
+    interp = route_arr[seg_idx] + fraction[:, None] * (route_arr[seg_idx + 1] - route_arr[seg_idx])
+
+    sampled_points.extend(
+        {'lat': lat, 'lon': lon, 'timestamp': int(ts), 'distance_km': round(distance, 2)}
+        for (lat, lon, ts), distance in zip(interp.tolist(), targets.tolist())
+    )
     return sampled_points
 
 # --- ▼▼▼ ここからが修正箇所 ▼▼▼ ---
@@ -156,13 +321,13 @@ def _generate_weather_report(points_to_check: List[Dict]) -> List[Dict]:
     if not points_to_check:
         return []
 
-    print("[1/2] Fetching basic weather info (precipitation) from Yahoo! API...")
-    points_with_base_weather = _get_weather_for_points_yahoo(points_to_check)
-    
-    print("[2/2] Fetching detailed weather (Sunny/Cloudy/Rain) and temperature from Open-Meteo API...")
-    for point in points_with_base_weather:
-        open_meteo_data = _get_open_meteo_data(point)
-        
+    # Yahoo! and Open-Meteo do not depend on each other, so both are fetched in one concurrent pass.
+    # This runs in a worker thread (see main.py), so it gets its own event loop via asyncio.run.
+    print("[1/2] Fetching basic weather info (Yahoo! API) and detailed weather/temperature (Open-Meteo API)...")
+    points_with_base_weather, open_meteo_results = asyncio.run(_fetch_all_weather(points_to_check))
+
+    print("[2/2] Merging Yahoo! and Open-Meteo results...")
+    for point, open_meteo_data in zip(points_with_base_weather, open_meteo_results):
         # Step 1: Add temperature from Open-Meteo
         if open_meteo_data:
             point['weather']['temperature'] = open_meteo_data['temperature']
@@ -191,46 +356,34 @@ def simulate_journey_and_get_weather(
     """
     Generate weather info for each point along route with timestamps.
     """
-    if not ordered_route_data_with_time:
+    if len(ordered_route_data_with_time) == 0:
         print("Error: Route data is empty."); return []
     if start_time is None:
         start_time = datetime.now()
 
     print(f"Starting report generation... (Simulation start time: {start_time.strftime('%Y-%m-%d %H:%M')})")
     
-    start_timestamp = start_time.timestamp()
-    route_with_timestamps = []
-    for point in ordered_route_data_with_time:
-        lat, lon, elapsed_seconds = point
-        absolute_timestamp = start_timestamp + elapsed_seconds
-        route_with_timestamps.append([lat, lon, absolute_timestamp])
-    
+    # 経過秒に出発時刻を足した絶対時刻の列も、ルート全体を1回の配列演算で求める
+    # (入力配列は呼び出し元のものなので書き換えず、新しい配列を作る)
+    route_arr = np.asarray(ordered_route_data_with_time, dtype=np.float64)
+    timestamps = (start_time.timestamp() + route_arr[:, 2]).astype(np.int64)
+
     # 入力された座標をそのまま天気予報取得の対象とするリストに変換する
-    points_for_weather = []
-    cumulative_distance = 0.0
-    if route_with_timestamps:
-        # 始点を追加
-        first_pt = route_with_timestamps[0]
-        points_for_weather.append({
-            'lat': first_pt[0],
-            'lon': first_pt[1],
-            'timestamp': int(first_pt[2]),
-            'distance_km': 0.0
-        })
-        
-        # 2点目以降の距離を計算しながら追加
-        for i in range(1, len(route_with_timestamps)):
-            prev_pt = route_with_timestamps[i-1]
-            curr_pt = route_with_timestamps[i]
-            distance = haversine(prev_pt[0], prev_pt[1], curr_pt[0], curr_pt[1])
-            cumulative_distance += distance
-            points_for_weather.append({
-                'lat': curr_pt[0],
-                'lon': curr_pt[1],
-                'timestamp': int(curr_pt[2]),
-                'distance_km': round(cumulative_distance, 2)
-            })
-            
+    # 区間距離はルート全体をまとめてNumPyで計算し、累積和で各地点までの距離を求める
+    _, cumulative_km = _route_distances_km(route_arr)
+
+    points_for_weather = [
+        {
+            'lat': lat,
+            'lon': lon,
+            'timestamp': timestamp,
+            'distance_km': round(distance, 2)
+        }
+        for lat, lon, timestamp, distance in zip(
+            route_arr[:, 0].tolist(), route_arr[:, 1].tolist(), timestamps.tolist(), cumulative_km.tolist()
+        )
+    ]
+
     print(f"Generating weather report for {len(points_for_weather)} points from the original route.")
     
     # 各座標の天気レポートを生成